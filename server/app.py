@@ -6,13 +6,15 @@ Sécurisé pour réseau local uniquement
 """
 
 from flask import Flask, request, render_template, jsonify, send_from_directory, abort
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from functools import wraps
+from collections import deque
 import logging
 import json
 import ipaddress
 import socket
+import threading
 import time
 import os
 
@@ -25,7 +27,7 @@ UPLOAD_FOLDER = Path("uploads")
 UPLOAD_FOLDER.mkdir(exist_ok=True)
 
 LOG_FILE = Path("events.log")
-MAX_LOG_ENTRIES = 100
+MAX_LOG_ENTRIES = 5000  # Capacité du tampon circulaire d'événements en mémoire
 
 # Sécurité
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB max
@@ -44,7 +46,121 @@ logging.basicConfig(
 # =============================================================================
 # STOCKAGE EN MÉMOIRE
 # =============================================================================
-events = []
+def parse_timestamp(value):
+    """
+    Parse un horodatage ISO 8601 en datetime UTC (ValueError si invalide)
+    Un horodatage sans fuseau est interprété en heure locale
+    """
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return moment.astimezone(timezone.utc)
+
+
+class Event:
+    """Événement journalisé, sérialisé en JSON une seule fois à la demande"""
+    __slots__ = ('timestamp', 'moment', 'type', 'message', 'details', 'ip', '_json')
+    
+    def __init__(self, timestamp, event_type, message, details, moment=None):
+        self.timestamp = timestamp
+        # Clé d'ordre en UTC : insensible aux changements d'heure locale
+        self.moment = moment or parse_timestamp(timestamp)
+        self.type = event_type
+        self.message = message
+        self.details = details
+        self.ip = details.get('ip') or details.get('source_ip')
+        self._json = None
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["timestamp"], data["type"], data["message"], data.get("details") or {})
+    
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "type": self.type,
+            "message": self.message,
+            "details": self.details
+        }
+    
+    def to_json(self):
+        if self._json is None:
+            self._json = json.dumps(self.to_dict())
+        return self._json
+
+
+class EventRing:
+    """
+    Tampon circulaire de taille fixe avec index par type et par IP
+    Les index conservent les événements du plus ancien au plus récent
+    """
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._count = 0  # Nombre total d'événements ajoutés
+        self._by_type = {}
+        self._by_ip = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return min(self._count, self.capacity)
+    
+    def append(self, event):
+        with self._lock:
+            slot = self._count % self.capacity
+            evicted = self._slots[slot]
+            
+            # L'événement écrasé est toujours le plus ancien de ses index
+            if evicted is not None:
+                self._unindex(self._by_type, evicted.type)
+                if evicted.ip:
+                    self._unindex(self._by_ip, evicted.ip)
+            
+            self._slots[slot] = event
+            self._by_type.setdefault(event.type, deque()).append(event)
+            if event.ip:
+                self._by_ip.setdefault(event.ip, deque()).append(event)
+            self._count += 1
+    
+    @staticmethod
+    def _unindex(index, key):
+        bucket = index[key]
+        bucket.popleft()
+        if not bucket:
+            del index[key]
+    
+    def _newest_first(self):
+        for seq in range(self._count - 1, self._count - len(self) - 1, -1):
+            yield self._slots[seq % self.capacity]
+    
+    def query(self, limit, event_type=None, since=None, ip=None):
+        """Retourne les événements les plus récents correspondant aux filtres"""
+        with self._lock:
+            # Parcourir l'index le plus petit, du plus récent au plus ancien
+            candidates = []
+            if event_type is not None:
+                candidates.append(self._by_type.get(event_type, ()))
+            if ip is not None:
+                candidates.append(self._by_ip.get(ip, ()))
+            source = reversed(min(candidates, key=len)) if candidates else self._newest_first()
+            
+            results = []
+            for event in source:
+                if len(results) >= limit:
+                    break
+                # Les clés UTC sont croissantes : tout ce qui suit est plus ancien
+                if since is not None and event.moment <= since:
+                    break
+                if event_type is not None and event.type != event_type:
+                    continue
+                if ip is not None and event.ip != ip:
+                    continue
+                results.append(event)
+            return results
+
+
+events = EventRing(MAX_LOG_ENTRIES)
 rate_limit_store = {}  # {ip: [(timestamp, count)]}
 
 # =============================================================================
@@ -80,8 +196,11 @@ def is_private_ip(ip_str):
     except ValueError:
         return False
 
-def is_on_local_network(ip_str):
-    """Vérifie si l'IP est sur le même réseau local"""
+def is_on_local_network(ip_str, local_network=None):
+    """
+    Vérifie si l'IP est sur le même réseau local
+    local_network : réseau déjà calculé (sinon déterminé à chaque appel)
+    """
     try:
         ip = ipaddress.ip_address(ip_str)
         
@@ -94,7 +213,8 @@ def is_on_local_network(ip_str):
             return False
         
         # Vérifier si sur le même sous-réseau
-        local_network = get_local_network()
+        if local_network is None:
+            local_network = get_local_network()
         if local_network and ip in local_network:
             return True
         
@@ -147,20 +267,14 @@ def check_rate_limit(ip):
 
 def log_event(event_type, message, details=None):
     """Enregistre un événement avec horodatage"""
-    event = {
-        "timestamp": datetime.now().isoformat(),
-        "type": event_type,
-        "message": message,
-        "details": details or {}
-    }
-    events.insert(0, event)
-    
-    if len(events) > MAX_LOG_ENTRIES:
-        events.pop()
+    moment = datetime.now(timezone.utc)
+    timestamp = moment.astimezone().replace(tzinfo=None).isoformat()
+    event = Event(timestamp, event_type, message, details or {}, moment)
+    events.append(event)
     
     try:
         with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(event) + '\n')
+            f.write(event.to_json() + '\n')
     except Exception as e:
         logging.error(f"Erreur écriture log: {e}")
     
@@ -183,6 +297,155 @@ def validate_filename(filename):
     
     return cleaned
 
+def save_image(image_data, client_ip):
+    """Sauvegarde une image JPEG validée dans le dossier du jour"""
+    # Créer le timestamp et le dossier
+    now = datetime.now()
+    date_folder = UPLOAD_FOLDER / now.strftime("%Y-%m-%d")
+    date_folder.mkdir(exist_ok=True)
+    
+    # Nom du fichier sécurisé
+    filename = f"IMG_{now.strftime('%Y-%m-%d_%H-%M-%S')}.jpg"
+    filepath = date_folder / filename
+    
+    # Éviter l'écrasement
+    counter = 1
+    while filepath.exists():
+        filename = f"IMG_{now.strftime('%Y-%m-%d_%H-%M-%S')}_{counter}.jpg"
+        filepath = date_folder / filename
+        counter += 1
+    
+    # Sauvegarder l'image
+    with open(filepath, 'wb') as f:
+        f.write(image_data)
+    
+    file_size = len(image_data) / 1024
+    
+    log_event(
+        "UPLOAD",
+        f"Photo reçue: {filename}",
+        {
+            "filename": filename,
+            "date": now.strftime("%Y-%m-%d"),
+            "time": now.strftime("%H:%M:%S"),
+            "size_kb": round(file_size, 2),
+            "path": str(filepath.relative_to(UPLOAD_FOLDER)),
+            "source_ip": client_ip
+        }
+    )
+    
+    return {
+        "success": True,
+        "filename": filename,
+        "path": str(filepath.relative_to(UPLOAD_FOLDER)),
+        "size_kb": round(file_size, 2)
+    }
+
+def resolve_upload_path(filename):
+    """Résout un chemin relatif au dossier uploads, None si traversée de répertoire"""
+    safe_path = Path(filename)
+    if '..' in safe_path.parts or safe_path.is_absolute():
+        return None
+    
+    full_path = UPLOAD_FOLDER / safe_path
+    if not full_path.resolve().is_relative_to(UPLOAD_FOLDER.resolve()):
+        return None
+    
+    return full_path
+
+def list_images():
+    """Parcourt le dossier uploads et retourne les images organisées par date"""
+    images_by_date = {}
+    
+    try:
+        for date_folder in sorted(UPLOAD_FOLDER.iterdir(), reverse=True):
+            if date_folder.is_dir() and not date_folder.name.startswith('.'):
+                date_str = date_folder.name
+                images = []
+                
+                for img_file in sorted(date_folder.glob("*.jpg"), reverse=True):
+                    try:
+                        # Extraire l'heure du nom de fichier
+                        parts = img_file.stem.split('_')
+                        time_str = parts[-1].replace('-', ':') if len(parts) >= 2 else "00:00:00"
+                        
+                        images.append({
+                            "filename": img_file.name,
+                            "path": f"{date_str}/{img_file.name}",
+                            "size": img_file.stat().st_size,
+                            "date": date_str,
+                            "time": time_str
+                        })
+                    except Exception:
+                        continue
+                
+                if images:
+                    images_by_date[date_str] = images
+    except Exception as e:
+        logging.error(f"Erreur lecture galerie: {e}")
+    
+    return images_by_date
+
+def compute_stats():
+    """Calcule les statistiques globales du dossier uploads"""
+    total_images = 0
+    total_size = 0
+    dates = []
+    
+    try:
+        for date_folder in UPLOAD_FOLDER.iterdir():
+            if date_folder.is_dir() and not date_folder.name.startswith('.'):
+                images = list(date_folder.glob("*.jpg"))
+                if images:
+                    dates.append(date_folder.name)
+                    total_images += len(images)
+                    total_size += sum(img.stat().st_size for img in images)
+    except Exception as e:
+        logging.error(f"Erreur calcul stats: {e}")
+    
+    return {
+        "total_images": total_images,
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "total_days": len(dates),
+        "first_date": min(dates) if dates else None,
+        "last_date": max(dates) if dates else None
+    }
+
+def query_events(args):
+    """
+    Interroge le tampon d'événements et retourne la réponse JSON sérialisée
+    Lève ValueError si le paramètre since n'est pas un horodatage ISO 8601
+    """
+    try:
+        limit = int(args.get('limit', 50))
+    except ValueError:
+        limit = 50
+    limit = min(limit, MAX_LOG_ENTRIES)
+    
+    since = args.get('since')
+    records = events.query(
+        limit,
+        event_type=args.get('type') or None,
+        since=parse_timestamp(since) if since else None,
+        ip=args.get('ip') or None
+    )
+    return '[' + ','.join(event.to_json() for event in records) + ']'
+
+def load_events():
+    """Charge les derniers événements depuis le fichier de log"""
+    if not LOG_FILE.exists():
+        return
+    try:
+        with open(LOG_FILE, 'r', encoding='utf-8') as f:
+            for line in deque(f, maxlen=MAX_LOG_ENTRIES):
+                try:
+                    event = Event.from_dict(json.loads(line.strip()))
+                    events.append(event)
+                except:
+                    pass
+    except Exception as e:
+        logging.warning(f"Impossible de charger les logs existants: {e}")
+
 # =============================================================================
 # DÉCORATEUR DE SÉCURITÉ
 # =============================================================================
@@ -322,47 +585,8 @@ def upload_image():
             log_event("ERROR", "Format d'image invalide (non-JPEG)", {"ip": client_ip})
             return jsonify({"error": "Format invalide - JPEG requis"}), 400
         
-        # Créer le timestamp et le dossier
-        now = datetime.now()
-        date_folder = UPLOAD_FOLDER / now.strftime("%Y-%m-%d")
-        date_folder.mkdir(exist_ok=True)
-        
-        # Nom du fichier sécurisé
-        filename = f"IMG_{now.strftime('%Y-%m-%d_%H-%M-%S')}.jpg"
-        filepath = date_folder / filename
-        
-        # Éviter l'écrasement
-        counter = 1
-        while filepath.exists():
-            filename = f"IMG_{now.strftime('%Y-%m-%d_%H-%M-%S')}_{counter}.jpg"
-            filepath = date_folder / filename
-            counter += 1
-        
-        # Sauvegarder l'image
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
-        
-        file_size = len(image_data) / 1024
-        
-        log_event(
-            "UPLOAD",
-            f"Photo reçue: {filename}",
-            {
-                "filename": filename,
-                "date": now.strftime("%Y-%m-%d"),
-                "time": now.strftime("%H:%M:%S"),
-                "size_kb": round(file_size, 2),
-                "path": str(filepath.relative_to(UPLOAD_FOLDER)),
-                "source_ip": client_ip
-            }
-        )
-        
-        return jsonify({
-            "success": True,
-            "filename": filename,
-            "path": str(filepath.relative_to(UPLOAD_FOLDER)),
-            "size_kb": round(file_size, 2)
-        }), 200
+        payload = save_image(image_data, client_ip)
+        return jsonify(payload), 200
         
     except Exception as e:
         error_msg = f"Erreur lors de la sauvegarde: {str(e)}"
@@ -375,44 +599,18 @@ def upload_image():
 @require_local_network
 def get_images():
     """Retourne la liste des images organisées par date"""
-    images_by_date = {}
-    
-    try:
-        for date_folder in sorted(UPLOAD_FOLDER.iterdir(), reverse=True):
-            if date_folder.is_dir() and not date_folder.name.startswith('.'):
-                date_str = date_folder.name
-                images = []
-                
-                for img_file in sorted(date_folder.glob("*.jpg"), reverse=True):
-                    try:
-                        # Extraire l'heure du nom de fichier
-                        parts = img_file.stem.split('_')
-                        time_str = parts[-1].replace('-', ':') if len(parts) >= 2 else "00:00:00"
-                        
-                        images.append({
-                            "filename": img_file.name,
-                            "path": f"{date_str}/{img_file.name}",
-                            "size": img_file.stat().st_size,
-                            "date": date_str,
-                            "time": time_str
-                        })
-                    except Exception:
-                        continue
-                
-                if images:
-                    images_by_date[date_str] = images
-    except Exception as e:
-        logging.error(f"Erreur lecture galerie: {e}")
-    
-    return jsonify(images_by_date)
+    return jsonify(list_images())
 
 
 @app.route('/api/events')
 @require_local_network
 def get_events():
-    """Retourne les derniers événements"""
-    limit = min(request.args.get('limit', 50, type=int), MAX_LOG_ENTRIES)
-    return jsonify(events[:limit])
+    """Retourne les derniers événements, filtrables par type, date (since) et IP"""
+    try:
+        body = query_events(request.args)
+    except ValueError:
+        return jsonify({"error": "Paramètre since invalide - format ISO 8601 requis"}), 400
+    return app.response_class(body, mimetype='application/json')
 
 
 @app.route('/uploads/<path:filename>')
@@ -421,12 +619,8 @@ def serve_image(filename):
     """Sert les images uploadées de manière sécurisée"""
     # Empêcher la traversée de répertoire
     try:
-        safe_path = Path(filename)
-        if '..' in safe_path.parts or safe_path.is_absolute():
-            abort(403)
-        
-        full_path = UPLOAD_FOLDER / safe_path
-        if not full_path.resolve().is_relative_to(UPLOAD_FOLDER.resolve()):
+        full_path = resolve_upload_path(filename)
+        if full_path is None:
             abort(403)
         
         if not full_path.exists():
@@ -441,28 +635,7 @@ def serve_image(filename):
 @require_local_network
 def get_stats():
     """Statistiques globales"""
-    total_images = 0
-    total_size = 0
-    dates = []
-    
-    try:
-        for date_folder in UPLOAD_FOLDER.iterdir():
-            if date_folder.is_dir() and not date_folder.name.startswith('.'):
-                images = list(date_folder.glob("*.jpg"))
-                if images:
-                    dates.append(date_folder.name)
-                    total_images += len(images)
-                    total_size += sum(img.stat().st_size for img in images)
-    except Exception as e:
-        logging.error(f"Erreur calcul stats: {e}")
-    
-    return jsonify({
-        "total_images": total_images,
-        "total_size_mb": round(total_size / (1024 * 1024), 2),
-        "total_days": len(dates),
-        "first_date": min(dates) if dates else None,
-        "last_date": max(dates) if dates else None
-    })
+    return jsonify(compute_stats())
 
 
 @app.route('/api/delete/<path:filename>', methods=['DELETE'])
@@ -472,12 +645,8 @@ def delete_image(filename):
     client_ip = get_client_ip()
     
     try:
-        safe_path = Path(filename)
-        if '..' in safe_path.parts or safe_path.is_absolute():
-            abort(403)
-        
-        full_path = UPLOAD_FOLDER / safe_path
-        if not full_path.resolve().is_relative_to(UPLOAD_FOLDER.resolve()):
+        full_path = resolve_upload_path(filename)
+        if full_path is None:
             abort(403)
         
         if not full_path.exists():
@@ -638,18 +807,7 @@ def cleanup_old_images():
 
 if __name__ == '__main__':
     # Charger les événements existants
-    if LOG_FILE.exists():
-        try:
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                for line in f.readlines()[-MAX_LOG_ENTRIES:]:
-                    try:
-                        event = json.loads(line.strip())
-                        events.append(event)
-                    except:
-                        pass
-            events.reverse()
-        except Exception as e:
-            logging.warning(f"Impossible de charger les logs existants: {e}")
+    load_events()
     
     server_ip = get_local_ip()
     local_network = get_local_network()
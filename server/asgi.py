@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mode de service asynchrone (ASGI) pour Mangeoire Connectée ESP32-S3
+Les routes d'ingestion et de médias (upload, /uploads/, événements, galerie)
+sont servies en asynchrone ; les autres routes restent gérées par Flask.
+"""
+
+from contextlib import asynccontextmanager
+from functools import partial
+import logging
+
+import anyio
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app,
+    MAX_UPLOAD_SIZE,
+    UPLOAD_FOLDER,
+    check_rate_limit,
+    compute_stats,
+    get_local_ip,
+    get_local_network,
+    is_on_local_network,
+    list_images,
+    load_events,
+    log_event,
+    query_events,
+    resolve_upload_path,
+    save_image,
+)
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+IO_WORKERS = 16  # Threads max pour les I/O disque (partagés par toutes les requêtes)
+WSGI_WORKERS = 16  # Threads max pour les routes servies par Flask
+
+# =============================================================================
+# FONCTIONS UTILITAIRES
+# =============================================================================
+
+async def run_io(func, *args):
+    """Exécute une fonction bloquante dans le pool de threads borné"""
+    return await anyio.to_thread.run_sync(partial(func, *args))
+
+def error_response(code, error, message):
+    """Réponse d'erreur JSON identique aux gestionnaires Flask"""
+    return JSONResponse({"error": error, "message": message, "code": code}, status_code=code)
+
+def get_client_ip(request):
+    """Récupère l'IP du client de manière sécurisée"""
+    # Vérifier les headers de proxy (uniquement si proxy de confiance)
+    if request.headers.get('X-Forwarded-For'):
+        # Prendre la première IP (client original)
+        ip = request.headers.get('X-Forwarded-For').split(',')[0].strip()
+    elif request.headers.get('X-Real-IP'):
+        ip = request.headers.get('X-Real-IP')
+    else:
+        ip = request.client.host if request.client else None
+    return ip
+
+async def check_access(request):
+    """Restreint l'accès au réseau local, retourne une réponse d'erreur ou None"""
+    client_ip = get_client_ip(request)
+    
+    # Vérifier si l'IP est sur le réseau local (réseau calculé au démarrage)
+    if not client_ip or not is_on_local_network(client_ip, request.app.state.local_network):
+        await run_io(
+            log_event,
+            "SECURITY",
+            f"Accès refusé - IP hors réseau local: {client_ip}",
+            # Même nom d'endpoint que request.endpoint côté Flask
+            {"ip": client_ip, "endpoint": request.scope["endpoint"].__name__}
+        )
+        return error_response(403, "Accès refusé", "Accès refusé - Réseau local uniquement")
+    
+    # Vérifier le rate limiting
+    if not check_rate_limit(client_ip):
+        await run_io(
+            log_event,
+            "SECURITY",
+            f"Rate limit dépassé pour: {client_ip}",
+            {"ip": client_ip}
+        )
+        return error_response(429, "Trop de requêtes", "Trop de requêtes - Réessayez plus tard")
+    
+    return None
+
+# =============================================================================
+# ROUTES ASYNCHRONES
+# =============================================================================
+
+async def upload_image(request):
+    """
+    Endpoint pour recevoir les photos de l'ESP32
+    Le corps est lu sans bloquer de thread, même sur un Wi-Fi lent
+    """
+    denied = await check_access(request)
+    if denied:
+        return denied
+    
+    client_ip = get_client_ip(request)
+    
+    try:
+        # Vérifier la taille avant de lire
+        content_length = request.headers.get('content-length')
+        if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE:
+            await run_io(log_event, "ERROR", f"Upload trop volumineux: {content_length} bytes", {"ip": client_ip})
+            return JSONResponse({"error": "Fichier trop volumineux"}, status_code=413)
+        
+        # Récupérer l'image par morceaux en vérifiant la taille réelle
+        chunks = []
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_UPLOAD_SIZE:
+                await run_io(log_event, "ERROR", f"Upload trop volumineux: {received} bytes", {"ip": client_ip})
+                return JSONResponse({"error": "Fichier trop volumineux"}, status_code=413)
+            chunks.append(chunk)
+        image_data = b''.join(chunks)
+        
+        if not image_data:
+            await run_io(log_event, "ERROR", "Aucune donnée d'image reçue", {"ip": client_ip})
+            return JSONResponse({"error": "No image data"}, status_code=400)
+        
+        # Vérifier le magic number JPEG (FFD8FF)
+        if len(image_data) < 3 or image_data[:2] != b'\xff\xd8':
+            await run_io(log_event, "ERROR", "Format d'image invalide (non-JPEG)", {"ip": client_ip})
+            return JSONResponse({"error": "Format invalide - JPEG requis"}, status_code=400)
+        
+        payload = await run_io(save_image, image_data, client_ip)
+        return JSONResponse(payload, status_code=200)
+    
+    except Exception as e:
+        error_msg = f"Erreur lors de la sauvegarde: {str(e)}"
+        await run_io(log_event, "ERROR", error_msg, {"ip": client_ip})
+        logging.error(error_msg, exc_info=True)
+        return JSONResponse({"error": "Erreur serveur"}, status_code=500)
+
+
+async def serve_image(request):
+    """Sert les images uploadées de manière sécurisée"""
+    denied = await check_access(request)
+    if denied:
+        return denied
+    
+    try:
+        # Traversée de répertoire : même réponse 404 que la route Flask
+        full_path = await run_io(resolve_upload_path, request.path_params['filename'])
+        if full_path is None or not await run_io(full_path.is_file):
+            return error_response(404, "Non trouvé", "Ressource introuvable")
+        
+        # FileResponse lit le fichier par blocs via le pool de threads borné
+        return FileResponse(full_path)
+    except Exception:
+        return error_response(404, "Non trouvé", "Ressource introuvable")
+
+
+async def get_events(request):
+    """Retourne les derniers événements, filtrables par type, date (since) et IP"""
+    denied = await check_access(request)
+    if denied:
+        return denied
+    
+    try:
+        body = await run_io(query_events, request.query_params)
+    except ValueError:
+        return JSONResponse({"error": "Paramètre since invalide - format ISO 8601 requis"}, status_code=400)
+    return Response(body, media_type='application/json')
+
+
+async def get_images(request):
+    """Retourne la liste des images organisées par date"""
+    denied = await check_access(request)
+    if denied:
+        return denied
+    
+    return JSONResponse(await run_io(list_images))
+
+
+async def get_stats(request):
+    """Statistiques globales"""
+    denied = await check_access(request)
+    if denied:
+        return denied
+    
+    return JSONResponse(await run_io(compute_stats))
+
+# =============================================================================
+# APPLICATION
+# =============================================================================
+
+@asynccontextmanager
+async def lifespan(_app):
+    """Initialise le pool d'I/O, le réseau local et charge les événements existants"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = IO_WORKERS
+    await run_io(load_events)
+    
+    # Calculé une seule fois : get_local_network() fait un appel socket
+    local_network = await run_io(get_local_network)
+    _app.state.local_network = local_network
+    await run_io(log_event, "SERVER", "Serveur démarré (ASGI, sécurisé LAN)", {
+        "port": 5000,
+        "server_ip": get_local_ip(),
+        "network": str(local_network) if local_network else "inconnu"
+    })
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/upload', upload_image, methods=['POST']),
+        Route('/uploads/{filename:path}', serve_image),
+        Route('/api/events', get_events),
+        Route('/api/images', get_images),
+        Route('/api/stats', get_stats),
+        # Toutes les autres routes (pages, suppression, health...) restent Flask
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_WORKERS)),
+    ],
+    lifespan=lifespan,
+)
+
+# =============================================================================
+# DÉMARRAGE
+# =============================================================================
+
+if __name__ == '__main__':
+    server_ip = get_local_ip()
+    local_network = get_local_network()
+    
+    print("\n" + "="*60)
+    print("🌿 SERVEUR MANGEOIRE CONNECTÉE ESP32-S3 (MODE ASYNC)")
+    print("🔒 MODE SÉCURISÉ - RÉSEAU LOCAL UNIQUEMENT")
+    print("="*60)
+    print(f"📡 IP du serveur: {server_ip}")
+    print(f"🌐 Réseau autorisé: {local_network if local_network else 'IPs privées'}")
+    print(f"🖼️  Galerie photos: http://{server_ip}:5000")
+    print(f"⚙️  Threads I/O max: {IO_WORKERS}")
+    print(f"📁 Dossier uploads: {UPLOAD_FOLDER.absolute()}")
+    print("="*60)
+    print("⚠️  Seules les connexions du réseau local sont autorisées")
+    print("="*60 + "\n")
+    
+    uvicorn.run(app, host='0.0.0.0', port=5000)
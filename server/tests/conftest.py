@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration pytest commune : chaque test tourne dans un dossier temporaire
+(uploads/ et events.log sont relatifs au dossier courant)
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Module app isolé : dossier uploads vide, événements et rate limit remis à zéro"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    
+    app = importlib.import_module("app")
+    monkeypatch.setattr(app, "events", app.EventRing(app.MAX_LOG_ENTRIES))
+    app.rate_limit_store.clear()
+    return app
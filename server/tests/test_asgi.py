@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Tests du mode de service asynchrone (asgi.py)"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from flask import jsonify
+from starlette.testclient import TestClient
+
+LOCAL = {"X-Forwarded-For": "127.0.0.1"}
+JPEG = b"\xff\xd8\xff" + b"x" * 100
+
+
+@pytest.fixture
+def client(server):
+    import asgi
+    with TestClient(asgi.app, headers=LOCAL) as c:
+        yield c
+
+
+def test_upload_then_serve(client):
+    r = client.post("/upload", content=JPEG)
+    assert r.status_code == 200
+    payload = r.json()
+    assert payload["success"] is True
+    
+    r = client.get(f"/uploads/{payload['path']}")
+    assert r.status_code == 200
+    assert r.content == JPEG
+
+
+def test_upload_rejects_non_jpeg(client):
+    r = client.post("/upload", content=b"abc")
+    assert r.status_code == 400
+    assert r.json() == {"error": "Format invalide - JPEG requis"}
+
+
+def test_serve_image_traversal_matches_flask(client, server):
+    # La route Flask répond 404 (abort(403) est rattrapé par except Exception)
+    flask_response = server.app.test_client().get("/uploads/..%2Fapp.py", headers=LOCAL)
+    r = client.get("/uploads/..%2Fapp.py")
+    assert r.status_code == flask_response.status_code == 404
+    assert r.json() == flask_response.json
+
+
+def test_non_local_ip_refused(server):
+    import asgi
+    with TestClient(asgi.app, headers={"X-Forwarded-For": "8.8.8.8"}) as c:
+        r = c.get("/api/events")
+    assert r.status_code == 403
+    assert r.json()["code"] == 403
+
+
+def test_security_event_details_match_flask(server):
+    import asgi
+    outside = {"X-Forwarded-For": "8.8.8.8"}
+    
+    server.app.test_client().get("/api/events", headers=outside)
+    flask_details = server.events.query(1)[0].details
+    with TestClient(asgi.app, headers=outside) as c:
+        c.get("/api/events")
+    
+    assert server.events.query(1)[0].details == flask_details == {"ip": "8.8.8.8", "endpoint": "get_events"}
+
+
+def test_local_network_computed_once(server, monkeypatch):
+    import asgi
+    calls = []
+    real = server.get_local_network
+    monkeypatch.setattr(asgi, "get_local_network", lambda: calls.append(1) or real())
+    monkeypatch.setattr(server, "get_local_network", lambda: calls.append(1) or real())
+    
+    # IP privée hors loopback : le test du sous-réseau est réellement évalué
+    with TestClient(asgi.app, headers={"X-Forwarded-For": "192.168.1.50"}) as c:
+        for _ in range(3):
+            assert c.get("/api/stats").status_code == 200
+    
+    assert len(calls) == 1
+
+
+def test_mounted_flask_routes_still_served(client):
+    assert client.get("/health").json()["status"] == "ok"
+    assert client.get("/galerie").status_code == 200
+
+
+def test_mounted_flask_routes_run_concurrently(server, monkeypatch):
+    import asgi
+    
+    def slow_health():
+        time.sleep(0.3)
+        return jsonify({"thread": threading.get_ident()})
+    
+    monkeypatch.setitem(server.app.view_functions, "health", slow_health)
+    
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(c.get("/health") for _ in range(4)))
+            return time.perf_counter() - start, responses
+    
+    elapsed, responses = asyncio.run(run())
+    assert elapsed < 0.9
+    assert len({r.json()["thread"] for r in responses}) == 4
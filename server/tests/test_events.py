@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Tests du tampon circulaire d'événements et de /api/events"""
+
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+LOCAL = {"X-Forwarded-For": "127.0.0.1"}
+START = datetime(2026, 10, 18, 22, 0, 0)  # Heure locale naïve, comme dans events.log
+
+
+def make_event(app, i, event_type="UPLOAD", ip=None, local=None):
+    local = local or START + timedelta(minutes=i)
+    details = {"ip": ip} if ip else {}
+    return app.Event(local.isoformat(), event_type, str(i), details)
+
+
+def messages(records):
+    return [event.message for event in records]
+
+
+class Poison:
+    """Événement piégé : échoue si la requête le lit"""
+    
+    def __getattr__(self, name):
+        raise AssertionError("la requête a parcouru un événement trop ancien")
+
+
+@pytest.fixture
+def paris_time(monkeypatch):
+    """Fuseau local Europe/Paris (retour à l'heure d'hiver le 25/10/2026 à 03:00)"""
+    monkeypatch.setenv("TZ", "Europe/Paris")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_query_newest_first_with_limit(server):
+    ring = server.EventRing(10)
+    for i in range(5):
+        ring.append(make_event(server, i))
+    
+    assert messages(ring.query(50)) == ["4", "3", "2", "1", "0"]
+    assert messages(ring.query(2)) == ["4", "3"]
+    assert ring.query(0) == []
+
+
+def test_query_by_type_and_ip(server):
+    ring = server.EventRing(10)
+    ring.append(make_event(server, 0, "UPLOAD", "10.0.0.1"))
+    ring.append(make_event(server, 1, "ERROR", "10.0.0.2"))
+    ring.append(make_event(server, 2, "UPLOAD", "10.0.0.2"))
+    ring.append(make_event(server, 3, "SERVER"))
+    
+    assert messages(ring.query(50, event_type="UPLOAD")) == ["2", "0"]
+    assert messages(ring.query(50, ip="10.0.0.2")) == ["2", "1"]
+    assert messages(ring.query(50, event_type="UPLOAD", ip="10.0.0.2")) == ["2"]
+    assert ring.query(50, event_type="DELETE") == []
+
+
+def test_source_ip_is_indexed(server):
+    ring = server.EventRing(10)
+    ring.append(server.Event(START.isoformat(), "UPLOAD", "photo", {"source_ip": "10.0.0.9"}))
+    
+    assert messages(ring.query(50, ip="10.0.0.9")) == ["photo"]
+
+
+def test_query_since(server):
+    ring = server.EventRing(10)
+    for i in range(5):
+        ring.append(make_event(server, i))
+    
+    since = server.parse_timestamp((START + timedelta(minutes=2)).isoformat())
+    assert messages(ring.query(50, since=since)) == ["4", "3"]
+
+
+def test_query_since_stops_at_first_older_event(server):
+    ring = server.EventRing(1000)
+    for i in range(1000):
+        ring.append(make_event(server, i, "UPLOAD", "10.0.0.1"))
+    
+    # Piéger tout ce qui est plus ancien que les 5 derniers événements
+    for i in range(994):
+        ring._slots[i] = Poison()
+        ring._by_type["UPLOAD"][i] = Poison()
+        ring._by_ip["10.0.0.1"][i] = Poison()
+    
+    since = server.parse_timestamp((START + timedelta(minutes=995)).isoformat())
+    expected = ["999", "998", "997", "996"]
+    assert messages(ring.query(50, since=since)) == expected
+    assert messages(ring.query(50, event_type="UPLOAD", since=since)) == expected
+    assert messages(ring.query(50, ip="10.0.0.1", since=since)) == expected
+
+
+def test_query_since_survives_clock_going_back(server, paris_time):
+    ring = server.EventRing(10)
+    # 02:30 CEST, puis 02:10 et 02:40 CET : l'heure locale recule, l'UTC avance
+    for i, minutes in enumerate([30, 70, 100]):
+        moment = datetime(2026, 10, 25, 0, 0, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+        timestamp = moment.astimezone().replace(tzinfo=None).isoformat()
+        ring.append(server.Event(timestamp, "UPLOAD", str(i), {}, moment))
+    
+    timestamps = [event.timestamp for event in ring.query(50)][::-1]
+    assert timestamps[1] < timestamps[0]
+    
+    since = server.parse_timestamp("2026-10-25T02:20:00+02:00")
+    assert messages(ring.query(50, since=since)) == ["2", "1", "0"]
+    since = server.parse_timestamp("2026-10-25T02:20:00+01:00")
+    assert messages(ring.query(50, since=since)) == ["2"]
+
+
+def test_log_event_timestamp_shape(server):
+    event = server.log_event("TEST", "message")
+    
+    assert event.moment.tzinfo == timezone.utc
+    assert event.timestamp == event.moment.astimezone().replace(tzinfo=None).isoformat()
+    assert server.parse_timestamp(event.timestamp) == event.moment
+
+
+def test_wraparound_matches_brute_force(server):
+    rng = random.Random(42)
+    capacity = 7
+    ring = server.EventRing(capacity)
+    history = []
+    
+    for i in range(200):
+        event = make_event(
+            server, i,
+            rng.choice(["UPLOAD", "ERROR", "SECURITY"]),
+            rng.choice([None, "10.0.0.1", "10.0.0.2"])
+        )
+        ring.append(event)
+        history.append(event)
+        kept = history[-capacity:][::-1]
+        
+        event_type = rng.choice([None, "UPLOAD", "ERROR"])
+        ip = rng.choice([None, "10.0.0.1", "10.0.0.2"])
+        since = rng.choice([None, server.parse_timestamp((START + timedelta(minutes=i - 3)).isoformat())])
+        limit = rng.randint(1, 10)
+        expected = [
+            e for e in kept
+            if (event_type is None or e.type == event_type)
+            and (ip is None or e.ip == ip)
+            and (since is None or e.moment > since)
+        ][:limit]
+        
+        assert len(ring) == min(i + 1, capacity)
+        assert ring.query(limit, event_type=event_type, since=since, ip=ip) == expected
+
+
+def test_event_json_is_cached(server):
+    event = make_event(server, 0, ip="10.0.0.1")
+    
+    assert json.loads(event.to_json()) == event.to_dict()
+    assert event.to_json() is event.to_json()
+
+
+@pytest.mark.parametrize("since, expected", [
+    ("2026-10-18T23:00:00", ["2"]),
+    ("2026-10-18 23:00", ["2"]),
+    ("2026-10-18", ["2", "1", "0"]),
+])
+def test_api_events_since_is_parsed(server, since, expected):
+    for i, hour in enumerate([21, 22, 23]):
+        server.events.append(make_event(server, i, local=START.replace(hour=hour, minute=30)))
+    
+    r = server.app.test_client().get("/api/events", query_string={"since": since}, headers=LOCAL)
+    assert r.status_code == 200
+    assert [e["message"] for e in r.json] == expected
+
+
+def test_api_events_invalid_since(server):
+    import asgi
+    from starlette.testclient import TestClient
+    
+    r = server.app.test_client().get("/api/events?since=foo", headers=LOCAL)
+    assert r.status_code == 400
+    
+    with TestClient(asgi.app, headers=LOCAL) as c:
+        assert c.get("/api/events?since=foo").status_code == 400
+
+
+def test_api_events_filters(server):
+    server.events.append(make_event(server, 0, "UPLOAD", "10.0.0.1"))
+    server.events.append(make_event(server, 1, "ERROR", "10.0.0.2"))
+    server.events.append(make_event(server, 2, "UPLOAD", "10.0.0.2"))
+    client = server.app.test_client()
+    
+    r = client.get("/api/events?type=UPLOAD&ip=10.0.0.2", headers=LOCAL)
+    assert [e["message"] for e in r.json] == ["2"]
+    r = client.get("/api/events?limit=1", headers=LOCAL)
+    assert r.json == [server.events.query(1)[0].to_dict()]
+
+
+def test_asgi_events_match_flask(server):
+    import asgi
+    from starlette.testclient import TestClient
+    
+    server.events.append(make_event(server, 0, "UPLOAD", "10.0.0.1"))
+    flask_json = server.app.test_client().get("/api/events?type=UPLOAD", headers=LOCAL).json
+    
+    with TestClient(asgi.app, headers=LOCAL) as c:
+        assert c.get("/api/events?type=UPLOAD").json() == flask_json